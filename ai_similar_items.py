@@ -0,0 +1,332 @@
+"""
+Similar Items Search using a local vector index
+Embeds product title/description/category with hashed character n-grams (NumPy only,
+no API calls) and answers top-k cosine similarity queries from a memory-mapped matrix
+"""
+
+import os
+import re
+import json
+import sys
+import time
+import zlib
+import hashlib
+import warnings
+warnings.filterwarnings('ignore')
+
+# Fix Windows encoding
+if sys.platform == 'win32':
+    import codecs
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
+    sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+
+# Check if NumPy is available
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("⚠ numpy not installed. Run: pip install numpy", file=sys.stderr)
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'similar_index')
+
+DIM = 512                      # Hashed feature space size
+NGRAM_SIZES = (3, 4)           # Character n-grams taken from each word
+FIELD_WEIGHTS = {'title': 2.0, 'category': 1.0, 'description': 1.0}
+DUPLICATE_THRESHOLD = 0.9      # Cosine score above which a listing is a near-duplicate
+MIN_SIMILARITY = 0.35          # Matches scoring below this are unrelated (hashing noise)
+SEARCH_BLOCK_ROWS = 65536      # Rows scored per matrix multiply
+MIN_CAPACITY = 1024
+
+
+def _features(text):
+    """Words plus their padded character n-grams"""
+    words = re.findall(r'\w+', text.lower())
+    features = list(words)
+    for word in words:
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return features
+
+
+def _content_hash(item):
+    text = '\x1f'.join(str(item.get(field) or '') for field in FIELD_WEIGHTS)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SimilarItemsIndex:
+    def __init__(self, index_dir=INDEX_DIR, dim=DIM):
+        self.index_dir = index_dir
+        self.meta_path = os.path.join(index_dir, 'index.json')
+        self.vectors_path = os.path.join(index_dir, 'vectors.f32')
+        self.lock_path = os.path.join(index_dir, '.lock')
+        self.dim = dim
+        os.makedirs(index_dir, exist_ok=True)
+        self._load_meta()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _load_meta(self):
+        meta = {'dim': self.dim, 'capacity': 0, 'keys': [], 'hashes': []}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        self.dim = meta['dim']
+        self.capacity = meta['capacity']
+        self.keys = meta['keys']          # Row -> item key (None = free slot)
+        self.hashes = meta['hashes']      # Row -> content hash of the embedded text
+        self.positions = {key: row for row, key in enumerate(self.keys) if key is not None}
+
+    def _save_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dim': self.dim,
+                'capacity': self.capacity,
+                'keys': self.keys,
+                'hashes': self.hashes
+            }, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _vectors(self, mode='r'):
+        if self.capacity == 0:
+            return None
+        return np.memmap(self.vectors_path, dtype=np.float32, mode=mode,
+                         shape=(self.capacity, self.dim))
+
+    def _grow(self, rows_needed):
+        """Extend the matrix file (zero-filled) so it holds at least rows_needed rows"""
+        if rows_needed <= self.capacity:
+            return
+        capacity = max(MIN_CAPACITY, self.capacity)
+        while capacity < rows_needed:
+            capacity *= 2
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(capacity * self.dim * 4)
+        self.capacity = capacity
+
+    def _acquire_lock(self, timeout=30):
+        """Cross-platform lock file so concurrent writers don't clobber each other"""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                # Break locks left behind by a crashed process
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > timeout:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    raise TimeoutError("Similar items index is locked")
+                time.sleep(0.05)
+
+    def _release_lock(self, fd):
+        os.close(fd)
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Embedding
+    # ------------------------------------------------------------------
+    def embed(self, items):
+        """
+        Embed items ({title, category, description}) into L2-normalised rows.
+        Each feature is hashed to a signed bucket; each field is scaled by its
+        weight and the square root of its length so long descriptions don't dominate.
+        """
+        matrix = np.zeros((len(items), self.dim), dtype=np.float32)
+        for row, item in enumerate(items):
+            for field, weight in FIELD_WEIGHTS.items():
+                text = item.get(field)
+                if not text:
+                    continue
+                hashes = np.array([zlib.crc32(feat.encode('utf-8')) for feat in _features(str(text))],
+                                  dtype=np.uint32)
+                if hashes.size == 0:
+                    continue
+                buckets = (hashes & 0x7FFFFFFF) % self.dim
+                signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+                np.add.at(matrix[row], buckets, signs * (weight / np.sqrt(hashes.size)))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def upsert(self, items):
+        """
+        Add or refresh items ({key, title, category, description}).
+        Items whose text hasn't changed are skipped.
+        """
+        fd = self._acquire_lock()
+        try:
+            self._load_meta()
+
+            changed = []
+            for item in items:
+                content_hash = _content_hash(item)
+                row = self.positions.get(item['key'])
+                if row is None or self.hashes[row] != content_hash:
+                    changed.append((item, content_hash))
+
+            if changed:
+                free_rows = [row for row, key in enumerate(self.keys) if key is None]
+                rows = []
+                for item, content_hash in changed:
+                    row = self.positions.get(item['key'])
+                    if row is None:
+                        if free_rows:
+                            row = free_rows.pop(0)
+                        else:
+                            row = len(self.keys)
+                            self.keys.append(None)
+                            self.hashes.append(None)
+                    self.keys[row] = item['key']
+                    self.hashes[row] = content_hash
+                    self.positions[item['key']] = row
+                    rows.append(row)
+
+                self._grow(len(self.keys))
+                vectors = self._vectors('r+')
+                vectors[rows] = self.embed([item for item, _ in changed])
+                vectors.flush()
+                del vectors
+
+            if changed:
+                self._save_meta()
+            return {'indexed': len(changed), 'total': len(self.positions)}
+        finally:
+            self._release_lock(fd)
+
+    def indexed_keys(self):
+        """Keys currently in the index (used to work out what a resync must remove)"""
+        return list(self.positions)
+
+    def remove(self, keys):
+        """Drop items from the index; their rows are reused by later inserts"""
+        fd = self._acquire_lock()
+        try:
+            self._load_meta()
+            removed = self._remove_keys(keys)
+            if removed:
+                self._save_meta()
+            return {'removed': removed, 'total': len(self.positions)}
+        finally:
+            self._release_lock(fd)
+
+    def _remove_keys(self, keys):
+        rows = [self.positions.pop(key) for key in keys if key in self.positions]
+        if not rows:
+            return 0
+        for row in rows:
+            self.keys[row] = None
+            self.hashes[row] = None
+        vectors = self._vectors('r+')
+        vectors[rows] = 0.0
+        vectors.flush()
+        del vectors
+        return len(rows)
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def search(self, queries, k=10):
+        """
+        Top-k cosine search for a batch of queries ({key?, title, category, description}).
+        All queries are scored together, one block of the matrix at a time.
+        A query's own key is never returned as its own match.
+        """
+        results = [[] for _ in queries]
+        n_rows = len(self.keys)
+        if not queries or n_rows == 0 or k <= 0:
+            return results
+
+        query_vectors = self.embed(queries)
+        own_rows = [self.positions.get(q.get('key')) for q in queries]
+        valid = np.array([key is not None for key in self.keys], dtype=bool)
+        vectors = self._vectors('r')
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, n_rows, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, n_rows)
+            scores = query_vectors @ np.asarray(vectors[start:end]).T
+            scores[:, ~valid[start:end]] = -np.inf
+            for q, own in enumerate(own_rows):
+                if own is not None and start <= own < end:
+                    scores[q, own - start] = -np.inf
+
+            # Merge this block with the running top-k
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+            keep = min(k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        for q in range(len(queries)):
+            for score, row in zip(best_scores[q], best_rows[q]):
+                # Skip free slots and unrelated items; hashed features give
+                # unrelated text small positive scores, so 0 is not a cutoff
+                if not np.isfinite(score) or score < MIN_SIMILARITY:
+                    continue
+                results[q].append({
+                    'key': self.keys[row],
+                    'score': round(float(score), 4),
+                    'near_duplicate': bool(score >= DUPLICATE_THRESHOLD)
+                })
+        return results
+
+
+def main():
+    """
+    Command-line usage (JSON array on stdin, JSON result on stdout):
+      python ai_similar_items.py index        items: [{key, title, category, description}]
+      python ai_similar_items.py remove       keys:  ["product:1", ...]
+      python ai_similar_items.py keys         (payload ignored) -> {"keys": [...]}
+      python ai_similar_items.py search [k]   queries: [{key?, title, category, description}]
+    """
+    if len(sys.argv) < 2 or sys.argv[1] not in ('index', 'remove', 'keys', 'search'):
+        print(json.dumps({
+            "error": "Missing or unknown command",
+            "usage": "python ai_similar_items.py <index|remove|keys|search [k]>  (JSON on stdin)"
+        }))
+        sys.exit(1)
+
+    command = sys.argv[1]
+    payload = json.load(sys.stdin)
+
+    if not NUMPY_AVAILABLE:
+        print(json.dumps({"available": False, "keys": [], "results": [[] for _ in payload] if command == 'search' else []}))
+        return
+
+    index = SimilarItemsIndex()
+    if command == 'index':
+        result = index.upsert(payload)
+    elif command == 'remove':
+        result = index.remove(payload)
+    elif command == 'keys':
+        result = {"keys": index.indexed_keys()}
+    else:
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        result = {"results": index.search(payload, k)}
+
+    result["available"] = True
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
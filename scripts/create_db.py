@@ -5,6 +5,11 @@ import sqlite3
 conn = sqlite3.connect("campus.db")
 cursor = conn.cursor()
 
+# Incremental auto-vacuum lets the archival job (server/archive.js) hand freed
+# pages back to the OS without a full VACUUM. Only takes effect on a new DB;
+# existing DBs are converted by the archival job on its first run.
+cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
 # USERS TABLE
 
 cursor.execute("""
@@ -273,6 +278,115 @@ CREATE TABLE IF NOT EXISTS reviews (
 );
 """)
 
+# ============================================
+# ARCHIVE TABLES (cold rows moved out by server/archive.js)
+# ============================================
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS products_archive (
+    product_id INTEGER PRIMARY KEY,
+    seller_id INTEGER,
+    buyer_id INTEGER,
+    title TEXT,
+    category TEXT,
+    price REAL,
+    condition TEXT,
+    description TEXT,
+    image1 TEXT,
+    image2 TEXT,
+    image3 TEXT,
+    quantity INTEGER,
+    status TEXT,
+    contact_method TEXT,
+    created_at DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+""")
+
+# Archive tables created before buyer_id was archived with the product
+cursor.execute("PRAGMA table_info(products_archive)")
+if 'buyer_id' not in [row[1] for row in cursor.fetchall()]:
+    try:
+        cursor.execute("ALTER TABLE products_archive ADD COLUMN buyer_id INTEGER")
+        print(" Migration: added 'buyer_id' column to products_archive table")
+    except Exception as e:
+        print(" Failed to add buyer_id column to products_archive:", e)
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS messages_archive (
+    message_id INTEGER PRIMARY KEY,
+    item_id INTEGER,
+    sender_id INTEGER,
+    receiver_id INTEGER,
+    message_text TEXT,
+    sent_at DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+""")
+
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS sold_items_archive (
+    sold_id INTEGER PRIMARY KEY,
+    product_id INTEGER,
+    seller_id INTEGER,
+    buyer_id INTEGER,
+    title TEXT,
+    category TEXT,
+    price REAL,
+    condition TEXT,
+    description TEXT,
+    contact_method TEXT,
+    image1 TEXT,
+    image2 TEXT,
+    image3 TEXT,
+    sold_at DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+""")
+
+# ============================================
+# UPLOAD BLOBS (content-addressed image store, see server/upload_store.js)
+# ============================================
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS upload_blobs (
+    digest TEXT PRIMARY KEY,                  -- SHA-256 of the file contents
+    size INTEGER,
+    ref_count INTEGER DEFAULT 0,              -- References from products/sold_items image columns
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+""")
+
+# Keep upload_blobs.ref_count in step with the image columns. Stored image
+# paths end in the 64-char digest (/uploads/ab/cd/<digest>); legacy names
+# simply don't match any blob.
+def create_blob_ref_triggers(table):
+    def adjust(alias, delta):
+        return "\n".join(
+            f"    UPDATE upload_blobs SET ref_count = ref_count {delta} WHERE digest = substr({alias}.{col}, -64);"
+            for col in ('image1', 'image2', 'image3')
+        )
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_blob_refs_insert AFTER INSERT ON {table}
+    BEGIN
+{adjust('NEW', '+ 1')}
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_blob_refs_update AFTER UPDATE OF image1, image2, image3 ON {table}
+    BEGIN
+{adjust('OLD', '- 1')}
+{adjust('NEW', '+ 1')}
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_blob_refs_delete AFTER DELETE ON {table}
+    BEGIN
+{adjust('OLD', '- 1')}
+    END;
+    """)
+
+for image_table in ('products', 'sold_items', 'products_archive', 'sold_items_archive'):
+    create_blob_ref_triggers(image_table)
+
 # ============================================
 # VIEW: PRODUCTS + SELLER INFO (for frontend display)
 # ============================================
@@ -0,0 +1,188 @@
+// Migrate uploads/ into the content-addressed store
+// Moves every legacy (randomly named) upload to uploads/<ab>/<cd>/<sha256>,
+// collapses identical files into one and rewrites the image columns to match.
+//
+// Order matters: every file is first linked into the store (the old name stays
+// valid), then all image columns are rewritten in one transaction, and only
+// after that commits are the old names removed. If the rewrite fails nothing
+// points at a missing file and the script can simply be run again.
+//
+// Usage: node scripts/dedupe-uploads.js [--dry-run] [--hardlink]
+//   --dry-run   Only report how much space deduplication would save
+//   --hardlink  Leave the old file names in place as hardlinks to the stored
+//               file so previously shared URLs keep working. The archival
+//               upload sweep keeps them while the stored file is referenced
+//               and removes them once it is not
+const path = require('path');
+const fs = require('fs');
+require('dotenv').config({ path: path.join(__dirname, '../server/.env') });
+const db = require('../server/database');
+const uploadStore = require('../server/upload_store');
+
+const dryRun = process.argv.includes('--dry-run');
+const keepOriginal = process.argv.includes('--hardlink');
+const usePostgres = process.env.DATABASE_URL ? true : false;
+
+// Tables that must be rewritten; the archive tables may not exist yet on older databases
+const REQUIRED_TABLES = ['products', 'sold_items'];
+
+// Helper function to convert SQLite ? placeholders to PostgreSQL $1, $2, etc.
+const convertPlaceholders = (query) => {
+  let index = 0;
+  return query.replace(/\?/g, () => `$${++index}`);
+};
+
+function dbAll(query, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(query, params, (err, rows) => (err ? reject(err) : resolve(rows || [])));
+  });
+}
+
+function sqliteRun(query, params = []) {
+  return new Promise((resolve, reject) => {
+    db.run(query, params, function (err) {
+      if (err) return reject(err);
+      resolve({ changes: this ? this.changes : 0 });
+    });
+  });
+}
+
+/**
+ * Run `work(exec)` inside a single transaction
+ * (a dedicated pool client on PostgreSQL, the script's own connection on SQLite)
+ */
+async function withTransaction(work) {
+  if (usePostgres) {
+    const client = await db.pool.connect();
+    const exec = async (query, params = []) => {
+      const result = await client.query(convertPlaceholders(query), params);
+      return { changes: result.rowCount };
+    };
+    try {
+      await client.query('BEGIN');
+      const value = await work(exec);
+      await client.query('COMMIT');
+      return value;
+    } catch (err) {
+      await client.query('ROLLBACK').catch(() => {});
+      throw err;
+    } finally {
+      client.release();
+    }
+  }
+
+  await sqliteRun('BEGIN IMMEDIATE');
+  try {
+    const value = await work(sqliteRun);
+    await sqliteRun('COMMIT');
+    return value;
+  } catch (err) {
+    await sqliteRun('ROLLBACK').catch(() => {});
+    throw err;
+  }
+}
+
+const isMissingTable = (err) => err.code === '42P01' || /no such table/i.test(err.message);
+
+const formatBytes = (bytes) => `${(bytes / (1024 * 1024)).toFixed(2)} MB`;
+
+async function dedupeUploads() {
+  console.log(`🗂️  Deduplicating uploads${dryRun ? ' (dry run)' : ''}...\n`);
+
+  // Legacy files are the ones directly in uploads/, not in a shard directory
+  const legacyFiles = uploadStore.listUploadFiles()
+    .filter(file => path.dirname(file.filePath) === uploadStore.UPLOADS_DIR);
+
+  const seen = new Set();
+  const renames = new Map(); // '/uploads/<legacy name>' -> '/uploads/ab/cd/<digest>'
+  const legacyPaths = [];     // Old names to remove once the rewrite has committed
+  let duplicates = 0;
+  let bytesSaved = 0;
+
+  for (const { name, filePath } of legacyFiles) {
+    try {
+      if (dryRun) {
+        const digest = await uploadStore.hashFile(filePath);
+        const { size } = fs.statSync(filePath);
+        if (seen.has(digest) || fs.existsSync(uploadStore.blobPath(digest))) {
+          duplicates++;
+          bytesSaved += size;
+        }
+        seen.add(digest);
+        continue;
+      }
+
+      // Link only: the old name keeps working until the columns are rewritten
+      const blob = await uploadStore.storeFile(filePath, { keepOriginal: true });
+      if (blob.deduplicated) {
+        duplicates++;
+        bytesSaved += blob.size;
+      }
+      renames.set(`/uploads/${name}`, blob.url);
+      legacyPaths.push(filePath);
+    } catch (err) {
+      console.warn(`⚠️ Skipping ${name}:`, err.message);
+    }
+  }
+
+  console.log(`   Legacy files:  ${legacyFiles.length}`);
+  console.log(`   Duplicates:    ${duplicates}`);
+  console.log(`   Space saved:   ${formatBytes(bytesSaved)}${keepOriginal ? ' (once old names are swept)' : ''}`);
+
+  if (dryRun) return;
+
+  // Archive tables may be missing on older databases. Probe them up front:
+  // on PostgreSQL a failed statement would abort the whole transaction.
+  const tables = [];
+  for (const table of uploadStore.IMAGE_TABLES) {
+    if (!REQUIRED_TABLES.includes(table)) {
+      try {
+        await dbAll(`SELECT 1 FROM ${table} LIMIT 1`);
+      } catch (err) {
+        if (!isMissingTable(err)) throw err;
+        console.warn(`⚠️ Skipping table ${table}:`, err.message);
+        continue;
+      }
+    }
+    tables.push(table);
+  }
+
+  // Point every image column at the stored file, all or nothing. Any failure
+  // (e.g. SQLITE_BUSY) aborts before a single old name is removed.
+  const rewritten = await withTransaction(async (exec) => {
+    let changed = 0;
+    for (const table of tables) {
+      for (const column of uploadStore.IMAGE_COLUMNS) {
+        for (const [oldUrl, newUrl] of renames) {
+          const { changes } = await exec(`UPDATE ${table} SET ${column} = ? WHERE ${column} = ?`, [newUrl, oldUrl]);
+          changed += changes || 0;
+        }
+      }
+    }
+    return changed;
+  });
+  console.log(`   Paths updated: ${rewritten}`);
+
+  if (!keepOriginal) {
+    for (const filePath of legacyPaths) {
+      try {
+        fs.unlinkSync(filePath);
+      } catch (err) {
+        console.warn(`⚠️ Failed to remove ${path.basename(filePath)}:`, err.message);
+      }
+    }
+  }
+
+  const { blobs, unreferenced, bytes } = await uploadStore.recountReferences();
+  console.log(`   Stored files:  ${blobs} (${formatBytes(bytes)}), ${unreferenced} unreferenced`);
+}
+
+dedupeUploads()
+  .then(() => {
+    console.log('\n✅ Upload deduplication complete!');
+    process.exit(0);
+  })
+  .catch(err => {
+    console.error('❌ Upload deduplication failed:', err);
+    process.exit(1);
+  });
@@ -0,0 +1,255 @@
+/**
+ * AI Job Scheduler for CampX Marketplace
+ * Sits in front of the Gemini-backed price predictor and image analyzer so that
+ * interactive requests (a seller waiting on the form) always go ahead of batch
+ * work (bulk re-pricing / re-moderation), within a global concurrency cap.
+ */
+
+// Priority classes, highest first
+const PRIORITIES = ['interactive', 'batch'];
+
+// Integer setting, falling back to the default when unset or not a number
+// (parseInt('abc') is NaN, which would silently disable every limit)
+function toInt(value, fallback) {
+  const parsed = parseInt(value, 10);
+  return Number.isFinite(parsed) ? parsed : fallback;
+}
+
+const FALLBACKS = {
+  maxConcurrency: 4,
+  interactiveReserved: 1,
+  requestsPerMinute: 0,
+  jobTimeoutMs: 90000
+};
+
+const DEFAULTS = {
+  // Max AI calls in flight at once (match to the Gemini API quota)
+  maxConcurrency: toInt(process.env.AI_MAX_CONCURRENCY, FALLBACKS.maxConcurrency),
+  // Slots batch jobs may never take, so interactive requests don't wait on them.
+  // Needs AI_MAX_CONCURRENCY >= 2: with a single slot a running batch job can
+  // still delay an interactive request
+  interactiveReserved: toInt(process.env.AI_INTERACTIVE_RESERVED, FALLBACKS.interactiveReserved),
+  // Optional requests-per-minute quota (0 = unlimited)
+  requestsPerMinute: toInt(process.env.AI_REQUESTS_PER_MINUTE, FALLBACKS.requestsPerMinute),
+  // A job still running after this long is killed and its slot freed (0 = no limit)
+  jobTimeoutMs: toInt(process.env.AI_JOB_TIMEOUT_MS, FALLBACKS.jobTimeoutMs)
+};
+
+class AIScheduler {
+  constructor(options = {}) {
+    const opts = { ...DEFAULTS, ...options };
+    Object.keys(FALLBACKS).forEach(key => { opts[key] = toInt(opts[key], FALLBACKS[key]); });
+    this.maxConcurrency = Math.max(1, opts.maxConcurrency);
+    this.interactiveReserved = Math.min(Math.max(0, opts.interactiveReserved), this.maxConcurrency - 1);
+    this.requestsPerMinute = Math.max(0, opts.requestsPerMinute);
+    this.jobTimeoutMs = Math.max(0, opts.jobTimeoutMs);
+
+    // At least one slot must stay free for batch work, so a cap of 1 can't
+    // reserve anything and batch jobs may delay interactive requests
+    if (this.interactiveReserved < opts.interactiveReserved) {
+      console.warn(`⚠️ AI scheduler: AI_MAX_CONCURRENCY=${this.maxConcurrency} leaves only ${this.interactiveReserved} of ${opts.interactiveReserved} reserved interactive slot(s); batch jobs can delay interactive requests. Use AI_MAX_CONCURRENCY >= ${opts.interactiveReserved + 1}.`);
+    }
+
+    // Per class: Map of userId -> FIFO of jobs; Map iteration order is the round-robin order
+    this.queues = {};
+    this.running = {};
+    this.metrics = {};
+    PRIORITIES.forEach(priority => {
+      this.queues[priority] = new Map();
+      this.running[priority] = 0;
+      this.metrics[priority] = { submitted: 0, completed: 0, failed: 0, timedOut: 0, totalWaitMs: 0, maxWaitMs: 0 };
+    });
+
+    this.startTimes = [];   // Start timestamps within the last minute (rate limiting)
+    this.retryTimer = null;
+  }
+
+  /**
+   * Queue an AI job
+   * @param {Function} task - Called with an AbortSignal, returns a Promise (e.g. spawns
+   *   the Python script with `spawn(cmd, args, { signal })` so a timed-out job is killed)
+   * @param {Object} options - { priority: 'interactive'|'batch', userId }
+   * @returns {Promise} Resolves/rejects with the task's result
+   */
+  schedule(task, { priority = 'interactive', userId = 'anonymous' } = {}) {
+    if (!PRIORITIES.includes(priority)) {
+      return Promise.reject(new Error(`Unknown AI job priority: ${priority}`));
+    }
+
+    return new Promise((resolve, reject) => {
+      const queue = this.queues[priority];
+      const key = String(userId);
+      if (!queue.has(key)) queue.set(key, []);
+      queue.get(key).push({ task, resolve, reject, enqueuedAt: Date.now() });
+      this.metrics[priority].submitted++;
+      this._drain();
+    });
+  }
+
+  /**
+   * Queue depth, running jobs and wait-time metrics per priority class
+   */
+  stats() {
+    const classes = {};
+    PRIORITIES.forEach(priority => {
+      const m = this.metrics[priority];
+      const finished = m.completed + m.failed;
+      const started = finished + this.running[priority];
+      classes[priority] = {
+        queueDepth: this._depth(priority),
+        queuedUsers: this.queues[priority].size,
+        running: this.running[priority],
+        submitted: m.submitted,
+        completed: m.completed,
+        failed: m.failed,
+        timedOut: m.timedOut,
+        avgWaitMs: started ? Math.round(m.totalWaitMs / started) : 0,
+        maxWaitMs: m.maxWaitMs,
+        oldestWaitMs: this._oldestWait(priority)
+      };
+    });
+    return {
+      maxConcurrency: this.maxConcurrency,
+      interactiveReserved: this.interactiveReserved,
+      requestsPerMinute: this.requestsPerMinute,
+      jobTimeoutMs: this.jobTimeoutMs,
+      startedLastMinute: this._recentStarts(),
+      classes
+    };
+  }
+
+  _depth(priority) {
+    let depth = 0;
+    this.queues[priority].forEach(jobs => { depth += jobs.length; });
+    return depth;
+  }
+
+  _oldestWait(priority) {
+    let oldest = 0;
+    const now = Date.now();
+    this.queues[priority].forEach(jobs => {
+      if (jobs.length) oldest = Math.max(oldest, now - jobs[0].enqueuedAt);
+    });
+    return oldest;
+  }
+
+  _recentStarts() {
+    const cutoff = Date.now() - 60 * 1000;
+    while (this.startTimes.length && this.startTimes[0] <= cutoff) this.startTimes.shift();
+    return this.startTimes.length;
+  }
+
+  _totalRunning() {
+    return PRIORITIES.reduce((sum, priority) => sum + this.running[priority], 0);
+  }
+
+  /**
+   * Whether a job of this class may start now. Batch jobs are held back from
+   * the reserved share of both the concurrency cap and the per-minute quota.
+   */
+  _canStart(priority) {
+    const reserve = priority === 'interactive' ? 0 : this.interactiveReserved;
+    if (this._totalRunning() >= this.maxConcurrency - reserve) return false;
+    if (this.requestsPerMinute && this._recentStarts() >= this._quotaFor(priority)) return false;
+    return true;
+  }
+
+  _quotaFor(priority) {
+    const reserve = priority === 'interactive' ? 0 : this.interactiveReserved;
+    return Math.max(1, this.requestsPerMinute - reserve);
+  }
+
+  /**
+   * Take the next job for a class, rotating between users so one user's burst
+   * can't starve everyone else
+   */
+  _dequeue(priority) {
+    const queue = this.queues[priority];
+    for (const [key, jobs] of queue) {
+      const job = jobs.shift();
+      queue.delete(key);
+      if (jobs.length) queue.set(key, jobs); // Re-insert at the back of the rotation
+      return job;
+    }
+    return null;
+  }
+
+  _drain() {
+    let started = true;
+    while (started) {
+      started = false;
+      for (const priority of PRIORITIES) {
+        if (this._depth(priority) === 0) continue;
+        // Never let a lower class start while a higher one is waiting
+        if (!this._canStart(priority)) break;
+        this._start(priority, this._dequeue(priority));
+        started = true;
+        break;
+      }
+    }
+
+    // Quota exhausted with work still queued: retry when the oldest start expires
+    const quotaBlocked = PRIORITIES.some(p => this._depth(p) > 0 && this._recentStarts() >= this._quotaFor(p));
+    if (this.requestsPerMinute && !this.retryTimer && quotaBlocked && this.startTimes.length) {
+      const delay = Math.max(this.startTimes[0] + 60 * 1000 - Date.now(), 10);
+      this.retryTimer = setTimeout(() => {
+        this.retryTimer = null;
+        this._drain();
+      }, delay);
+      if (this.retryTimer.unref) this.retryTimer.unref();
+    }
+  }
+
+  _start(priority, job) {
+    const metrics = this.metrics[priority];
+    const waitMs = Date.now() - job.enqueuedAt;
+    metrics.totalWaitMs += waitMs;
+    metrics.maxWaitMs = Math.max(metrics.maxWaitMs, waitMs);
+
+    this.running[priority]++;
+    this.startTimes.push(Date.now());
+
+    // A hung Python/Gemini call must not hold its slot forever: on timeout the
+    // task's signal is aborted (killing the child), the job is rejected and the
+    // slot is freed even if the task never settles
+    const controller = new AbortController();
+    let timer = null;
+    let timedOut = false;
+    const timeout = new Promise((resolve, reject) => {
+      if (!this.jobTimeoutMs) return;
+      timer = setTimeout(() => {
+        timedOut = true;
+        const err = new Error(`AI job timed out after ${this.jobTimeoutMs} ms`);
+        controller.abort(err);
+        reject(err);
+      }, this.jobTimeoutMs);
+    });
+
+    Promise.race([Promise.resolve().then(() => job.task(controller.signal)), timeout])
+      .then(
+        (result) => {
+          metrics.completed++;
+          job.resolve(result);
+        },
+        (err) => {
+          metrics.failed++;
+          if (timedOut) metrics.timedOut++;
+          job.reject(err);
+        }
+      )
+      .finally(() => {
+        clearTimeout(timer);
+        this.running[priority]--;
+        this._drain();
+      });
+  }
+}
+
+// Shared scheduler for all AI calls in this process
+const aiScheduler = new AIScheduler();
+
+module.exports = {
+  AIScheduler,
+  aiScheduler,
+  PRIORITIES
+};
@@ -0,0 +1,370 @@
+/**
+ * Cold Data Archival for CampX Marketplace
+ * Moves sold/old rows out of the hot tables into *_archive tables,
+ * reclaims free space and sweeps upload files nothing points at anymore.
+ *
+ * Run manually:   node server/archive.js
+ * Or schedule it: ARCHIVE_INTERVAL_HOURS=24 (checked in server.js)
+ */
+
+const path = require('path');
+const fs = require('fs');
+
+// Load environment variables when run as a standalone script
+require('dotenv').config({ path: path.join(__dirname, '.env') });
+
+const db = require('./database');
+const uploadStore = require('./upload_store');
+const usePostgres = process.env.DATABASE_URL ? true : false;
+
+// Defaults can be overridden with env vars or per-call options
+const DEFAULTS = {
+  soldProductDays: parseInt(process.env.ARCHIVE_SOLD_PRODUCT_DAYS || '30', 10),
+  messageDays: parseInt(process.env.ARCHIVE_MESSAGE_DAYS || '180', 10),
+  soldItemDays: parseInt(process.env.ARCHIVE_SOLD_ITEM_DAYS || '365', 10),
+  uploadGraceHours: parseInt(process.env.ARCHIVE_UPLOAD_GRACE_HOURS || '24', 10),
+  batchSize: parseInt(process.env.ARCHIVE_BATCH_SIZE || '500', 10),
+  vacuumPages: parseInt(process.env.ARCHIVE_VACUUM_PAGES || '1000', 10),
+  // How long the job waits on locks held by the server's own connection
+  busyTimeoutMs: parseInt(process.env.ARCHIVE_BUSY_TIMEOUT_MS || '10000', 10)
+};
+
+// SQLite: the job gets its own connection (see openSqlite). Sharing the server's
+// single connection would pull concurrent request writes into our transactions.
+let sqliteDb = null;
+
+// Columns copied into the archive tables. Every column must exist in both the
+// hot and the archive table (create_db.py / init-postgres.js add them);
+// archived_at is filled in by the job.
+// products.buyer_id only exists on SQLite
+const PRODUCT_COLUMNS = [
+  'product_id', 'seller_id', ...(usePostgres ? [] : ['buyer_id']), 'title', 'category', 'price', 'condition',
+  'description', 'image1', 'image2', 'image3', 'quantity', 'status', 'contact_method', 'created_at'
+];
+const SOLD_ITEM_COLUMNS = [
+  'sold_id', 'product_id', 'seller_id', 'buyer_id', 'title', 'category', 'price', 'condition',
+  'description', 'contact_method', 'image1', 'image2', 'image3', 'sold_at'
+];
+// messages uses sent_at on SQLite and created_at on PostgreSQL
+const MESSAGE_TIME_COLUMN = usePostgres ? 'created_at' : 'sent_at';
+const MESSAGE_COLUMNS = ['message_id', 'item_id', 'sender_id', 'receiver_id', 'message_text', MESSAGE_TIME_COLUMN];
+
+// Helper function to convert SQLite ? placeholders to PostgreSQL $1, $2, etc.
+const convertPlaceholders = (query) => {
+  let index = 0;
+  return query.replace(/\?/g, () => `$${++index}`);
+};
+
+/**
+ * Open the job's own SQLite connection to the same file database.js uses
+ */
+function openSqlite(busyTimeoutMs) {
+  const sqlite3 = require('sqlite3');
+  return new Promise((resolve, reject) => {
+    const conn = new sqlite3.Database(path.join(__dirname, '../campus.db'), (err) => {
+      if (err) return reject(err);
+      conn.configure('busyTimeout', busyTimeoutMs);
+      resolve(conn);
+    });
+  });
+}
+
+function closeSqlite() {
+  if (!sqliteDb) return Promise.resolve();
+  const conn = sqliteDb;
+  sqliteDb = null;
+  return new Promise((resolve) => conn.close(() => resolve()));
+}
+
+/**
+ * Promise wrapper around the SQLite callback API
+ * @returns {Promise<{rows: Array, changes: number}>}
+ */
+function sqliteExec(query, params = []) {
+  return new Promise((resolve, reject) => {
+    if (/^\s*(SELECT|PRAGMA)/i.test(query)) {
+      sqliteDb.all(query, params, (err, rows) => (err ? reject(err) : resolve({ rows: rows || [], changes: 0 })));
+    } else {
+      sqliteDb.run(query, params, function (err) {
+        if (err) return reject(err);
+        resolve({ rows: [], changes: this.changes });
+      });
+    }
+  });
+}
+
+/**
+ * Run `work(exec)` inside a single transaction.
+ * PostgreSQL needs a dedicated client from the pool; SQLite uses the job's own connection.
+ */
+async function withTransaction(work) {
+  if (usePostgres) {
+    const client = await db.pool.connect();
+    const exec = async (query, params = []) => {
+      const result = await client.query(convertPlaceholders(query), params);
+      return { rows: result.rows, changes: result.rowCount };
+    };
+    try {
+      await client.query('BEGIN');
+      const value = await work(exec);
+      await client.query('COMMIT');
+      return value;
+    } catch (err) {
+      await client.query('ROLLBACK').catch(() => {});
+      throw err;
+    } finally {
+      client.release();
+    }
+  }
+
+  const exec = sqliteExec;
+  await exec('BEGIN IMMEDIATE');
+  try {
+    const value = await work(exec);
+    await exec('COMMIT');
+    return value;
+  } catch (err) {
+    await exec('ROLLBACK').catch(() => {});
+    throw err;
+  }
+}
+
+/**
+ * Run a single statement outside of a transaction
+ */
+async function execute(query, params = []) {
+  if (usePostgres) {
+    const result = await db.pool.query(convertPlaceholders(query), params);
+    return { rows: result.rows, changes: result.rowCount };
+  }
+  return sqliteExec(query, params);
+}
+
+/**
+ * Cutoff timestamp string comparable with CURRENT_TIMESTAMP columns on both databases
+ * @param {number} days - Age in days
+ */
+function cutoff(days) {
+  return new Date(Date.now() - days * 24 * 60 * 60 * 1000)
+    .toISOString()
+    .replace('T', ' ')
+    .replace(/\.\d+Z$/, '');
+}
+
+/**
+ * Move rows matching `where` from `table` into `${table}_archive`, batch by batch.
+ * Each batch is its own transaction so live traffic is never blocked for long.
+ * @param {Object} spec - { table, idColumn, columns, where, params, before }
+ * @returns {Promise<number>} Number of rows archived
+ */
+async function archiveInBatches(spec, batchSize) {
+  const { table, idColumn, columns, where, params = [], before } = spec;
+  const columnList = columns.join(', ');
+  let total = 0;
+
+  while (true) {
+    const moved = await withTransaction(async (exec) => {
+      const { rows } = await exec(
+        `SELECT ${idColumn} AS id FROM ${table} WHERE ${where} ORDER BY ${idColumn} LIMIT ?`,
+        [...params, batchSize]
+      );
+      if (rows.length === 0) return 0;
+
+      const ids = rows.map(r => r.id);
+      const placeholders = ids.map(() => '?').join(', ');
+
+      // Let dependants move first (e.g. messages/wishlist of a sold product)
+      if (before) await before(exec, ids, placeholders);
+
+      await exec(
+        `INSERT INTO ${table}_archive (${columnList}, archived_at)
+         SELECT ${columnList}, CURRENT_TIMESTAMP FROM ${table} WHERE ${idColumn} IN (${placeholders})`,
+        ids
+      );
+      await exec(`DELETE FROM ${table} WHERE ${idColumn} IN (${placeholders})`, ids);
+      return ids.length;
+    });
+
+    total += moved;
+    if (moved < batchSize) break;
+  }
+
+  return total;
+}
+
+/**
+ * Reclaim pages freed by the archival.
+ * SQLite: incremental_vacuum (switches the DB to auto_vacuum=INCREMENTAL on first run).
+ * PostgreSQL: plain VACUUM ANALYZE of the hot tables.
+ */
+async function vacuum(pages) {
+  if (usePostgres) {
+    for (const table of ['products', 'messages', 'sold_items', 'wishlist']) {
+      await execute(`VACUUM (ANALYZE) ${table}`);
+    }
+    return;
+  }
+
+  const { rows } = await execute('PRAGMA auto_vacuum');
+  const mode = rows[0] ? Object.values(rows[0])[0] : 0;
+  if (mode !== 2) {
+    // auto_vacuum can only be changed by rebuilding the file once
+    console.log('🧹 Enabling incremental auto_vacuum (one-time full VACUUM)...');
+    await execute('PRAGMA auto_vacuum = INCREMENTAL');
+    await execute('VACUUM');
+    return;
+  }
+  await execute(`PRAGMA incremental_vacuum(${parseInt(pages, 10) || 0})`);
+}
+
+/**
+ * Delete upload files nothing references anymore.
+ * Content-addressed blobs go when their upload_blobs.ref_count drops to zero;
+ * legacy flat files (and blobs without a row) are checked against the image columns.
+ * Legacy names left as hardlinks by `scripts/dedupe-uploads.js --hardlink` are
+ * kept for as long as the blob they share contents with is still referenced.
+ * Files younger than the grace period are kept so in-flight temp uploads
+ * (/api/upload-temp-image(s) before the product is saved) are never removed.
+ * @returns {Promise<number>} Number of files removed
+ */
+async function sweepUploads(graceHours = DEFAULTS.uploadGraceHours) {
+  const refCounts = await uploadStore.loadRefCounts();
+  const references = await uploadStore.collectReferences();
+  const graceCutoff = Date.now() - graceHours * 60 * 60 * 1000;
+  const removedBlobs = [];
+  let removed = 0;
+
+  const isReferenced = ({ name, isBlob }) => (
+    isBlob && refCounts.has(name) ? refCounts.get(name) > 0 : references.has(name)
+  );
+
+  // Covers both legacy flat files and content-addressed blobs in shard directories
+  const files = uploadStore.listUploadFiles();
+
+  // Inodes of referenced blobs that also have other names (hardlinked legacy files)
+  const liveLinkedInodes = new Set();
+  files.filter(file => file.isBlob && isReferenced(file)).forEach(file => {
+    try {
+      const stat = fs.statSync(file.filePath);
+      if (stat.nlink > 1) liveLinkedInodes.add(`${stat.dev}:${stat.ino}`);
+    } catch (err) {
+      console.warn(`⚠️ Failed to stat upload ${file.name}:`, err.message);
+    }
+  });
+
+  for (const file of files) {
+    if (isReferenced(file)) continue;
+    try {
+      const stat = fs.statSync(file.filePath);
+      if (!file.isBlob && stat.nlink > 1 && liveLinkedInodes.has(`${stat.dev}:${stat.ino}`)) continue;
+      if (stat.mtimeMs > graceCutoff) continue;
+      fs.unlinkSync(file.filePath);
+      removed++;
+      if (file.isBlob) removedBlobs.push(file.name);
+    } catch (err) {
+      console.warn(`⚠️ Failed to sweep upload ${file.name}:`, err.message);
+    }
+  }
+
+  await uploadStore.forgetBlobs(removedBlobs);
+  return removed;
+}
+
+/**
+ * Archive cold marketplace data
+ * @param {Object} options - Overrides for DEFAULTS
+ * @returns {Promise<Object>} Counts of archived rows and removed files
+ */
+async function archiveColdData(options = {}) {
+  const opts = { ...DEFAULTS, ...options };
+  const summary = {};
+
+  console.log('📦 Archiving cold marketplace data...');
+
+  if (!usePostgres) {
+    if (sqliteDb) throw new Error('Archival job is already running');
+    sqliteDb = await openSqlite(opts.busyTimeoutMs);
+  }
+  try {
+    // 1. Sold-out products: their history lives on in sold_items, so they only
+    //    bloat the feed. The horizon runs from the last sale; products marked
+    //    Sold by hand (PUT /api/products/:id) or sold before sold_items existed
+    //    have no sale row and fall back to their listing date. Products whose
+    //    conversation is still recent (e.g. the booking notice with the
+    //    buyer's contact details) stay hot until it cools down. Wishlist rows
+    //    pointing at them are dropped (nothing can be bought anymore).
+    const soldCutoff = cutoff(opts.soldProductDays);
+    const messageCutoff = cutoff(opts.messageDays);
+    summary.products = await archiveInBatches({
+      table: 'products',
+      idColumn: 'product_id',
+      columns: PRODUCT_COLUMNS,
+      where: `status = 'Sold'
+        AND COALESCE((SELECT MAX(s.sold_at) FROM sold_items s WHERE s.product_id = products.product_id), products.created_at) < ?
+        AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.item_id = products.product_id AND m.${MESSAGE_TIME_COLUMN} >= ?)`,
+      params: [soldCutoff, messageCutoff],
+      before: async (exec, ids, placeholders) => {
+        // Only messages past the message horizon move with the product
+        await exec(
+          `INSERT INTO messages_archive (${MESSAGE_COLUMNS.join(', ')}, archived_at)
+           SELECT ${MESSAGE_COLUMNS.join(', ')}, CURRENT_TIMESTAMP FROM messages
+           WHERE item_id IN (${placeholders}) AND ${MESSAGE_TIME_COLUMN} < ?`,
+          [...ids, messageCutoff]
+        );
+        await exec(
+          `DELETE FROM messages WHERE item_id IN (${placeholders}) AND ${MESSAGE_TIME_COLUMN} < ?`,
+          [...ids, messageCutoff]
+        );
+        await exec(`DELETE FROM wishlist WHERE product_id IN (${placeholders})`, ids);
+      }
+    }, opts.batchSize);
+
+    // 2. Old inbox messages
+    summary.messages = await archiveInBatches({
+      table: 'messages',
+      idColumn: 'message_id',
+      columns: MESSAGE_COLUMNS,
+      where: `${MESSAGE_TIME_COLUMN} < ?`,
+      params: [messageCutoff]
+    }, opts.batchSize);
+
+    // 3. Old sale snapshots
+    summary.soldItems = await archiveInBatches({
+      table: 'sold_items',
+      idColumn: 'sold_id',
+      columns: SOLD_ITEM_COLUMNS,
+      where: 'sold_at < ?',
+      params: [cutoff(opts.soldItemDays)]
+    }, opts.batchSize);
+
+    // A failed vacuum (e.g. SQLITE_BUSY while the server is reading) only
+    // delays space reclamation; it must not skip the upload sweep
+    try {
+      await vacuum(opts.vacuumPages);
+    } catch (err) {
+      console.warn('⚠️ Vacuum skipped:', err.message);
+    }
+
+    summary.uploadsRemoved = await sweepUploads(opts.uploadGraceHours);
+  } finally {
+    await closeSqlite();
+  }
+
+  console.log(`✅ Archived ${summary.products} products, ${summary.messages} messages, ${summary.soldItems} sold items; removed ${summary.uploadsRemoved} unused uploads`);
+  return summary;
+}
+
+// Run if called directly
+if (require.main === module) {
+  archiveColdData()
+    .then(() => process.exit(0))
+    .catch((err) => {
+      console.error('❌ Archival failed:', err);
+      process.exit(1);
+    });
+}
+
+module.exports = {
+  archiveColdData,
+  sweepUploads
+};
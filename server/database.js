@@ -93,6 +93,8 @@ if (usePostgres) {
     if (err) console.error('Database connection failed:', err.message);
     else console.log('💾 Using SQLite database (local development)');
   });
+  // Wait on locks held by the archival job (server/archive.js) instead of failing
+  db.configure('busyTimeout', 5000);
 }
 
 module.exports = db;
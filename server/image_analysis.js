@@ -5,13 +5,23 @@
 const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs');
+const { aiScheduler } = require('./ai_scheduler');
 
 /**
  * Analyze product image(s) using AI
  * @param {string|string[]} imagePaths - Single path or array of paths to uploaded images
+ * @param {Object} options - Scheduling: { priority: 'interactive'|'batch', userId }
  * @returns {Promise<Object>} Analysis result with product details and legitimacy check
  */
-function analyzeImage(imagePaths) {
+function analyzeImage(imagePaths, options = {}) {
+    return aiScheduler.schedule((signal) => runImageAnalysis(imagePaths, signal), options);
+}
+
+/**
+ * Spawn the Python analyzer (called by the scheduler when a slot is free)
+ * @param {AbortSignal} signal - Aborted by the scheduler on timeout; kills the process
+ */
+function runImageAnalysis(imagePaths, signal) {
     return new Promise((resolve, reject) => {
         // Convert single path to array for uniform processing
         const paths = Array.isArray(imagePaths) ? imagePaths : [imagePaths];
@@ -40,7 +50,7 @@ function analyzeImage(imagePaths) {
         console.log(`🔍 Analyzing ${paths.length} image(s): ${paths.join(', ')}`);
         
         // Pass all image paths as arguments
-        const pythonProcess = spawn(pythonCmd, [scriptPath, ...paths]);
+        const pythonProcess = spawn(pythonCmd, [scriptPath, ...paths], { signal });
         
         let output = '';
         let errorOutput = '';
@@ -91,6 +101,11 @@ function analyzeImage(imagePaths) {
                 reject(new Error(`Failed to parse analysis result: ${error.message}`));
             }
         });
+
+        // Without this a failed spawn would never settle and hold a scheduler slot
+        pythonProcess.on('error', (err) => {
+            reject(new Error('Failed to start Python process: ' + err.message));
+        });
     });
 }
 
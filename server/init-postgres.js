@@ -105,6 +105,98 @@ async function initializePostgresDB() {
       )
     `);
 
+    // Archive tables (cold rows moved out by server/archive.js)
+    await pool.query(`
+      CREATE TABLE IF NOT EXISTS products_archive (
+        product_id INTEGER PRIMARY KEY,
+        seller_id INTEGER,
+        title TEXT,
+        category TEXT,
+        price REAL,
+        condition TEXT,
+        description TEXT,
+        image1 TEXT,
+        image2 TEXT,
+        image3 TEXT,
+        quantity INTEGER,
+        status TEXT,
+        contact_method TEXT,
+        created_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+      )
+    `);
+
+    await pool.query(`
+      CREATE TABLE IF NOT EXISTS messages_archive (
+        message_id INTEGER PRIMARY KEY,
+        item_id INTEGER,
+        sender_id INTEGER,
+        receiver_id INTEGER,
+        message_text TEXT,
+        created_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+      )
+    `);
+
+    await pool.query(`
+      CREATE TABLE IF NOT EXISTS sold_items_archive (
+        sold_id INTEGER PRIMARY KEY,
+        product_id INTEGER,
+        seller_id INTEGER,
+        buyer_id INTEGER,
+        title TEXT,
+        category TEXT,
+        price REAL,
+        condition TEXT,
+        description TEXT,
+        contact_method TEXT,
+        image1 TEXT,
+        image2 TEXT,
+        image3 TEXT,
+        sold_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+      )
+    `);
+
+    // Upload blobs (content-addressed image store, see server/upload_store.js)
+    await pool.query(`
+      CREATE TABLE IF NOT EXISTS upload_blobs (
+        digest TEXT PRIMARY KEY,
+        size BIGINT,
+        ref_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+      )
+    `);
+
+    // Keep upload_blobs.ref_count in step with the image columns. Stored image
+    // paths end in the 64-char digest (/uploads/ab/cd/<digest>).
+    await pool.query(`
+      CREATE OR REPLACE FUNCTION upload_blob_refs() RETURNS trigger AS $$
+      BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+          UPDATE upload_blobs SET ref_count = ref_count - 1 WHERE digest = right(OLD.image1, 64);
+          UPDATE upload_blobs SET ref_count = ref_count - 1 WHERE digest = right(OLD.image2, 64);
+          UPDATE upload_blobs SET ref_count = ref_count - 1 WHERE digest = right(OLD.image3, 64);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+          UPDATE upload_blobs SET ref_count = ref_count + 1 WHERE digest = right(NEW.image1, 64);
+          UPDATE upload_blobs SET ref_count = ref_count + 1 WHERE digest = right(NEW.image2, 64);
+          UPDATE upload_blobs SET ref_count = ref_count + 1 WHERE digest = right(NEW.image3, 64);
+        END IF;
+        RETURN NULL;
+      END;
+      $$ LANGUAGE plpgsql
+    `);
+
+    for (const table of ['products', 'sold_items', 'products_archive', 'sold_items_archive']) {
+      await pool.query(`DROP TRIGGER IF EXISTS ${table}_blob_refs ON ${table}`);
+      await pool.query(`
+        CREATE TRIGGER ${table}_blob_refs
+        AFTER INSERT OR DELETE OR UPDATE OF image1, image2, image3 ON ${table}
+        FOR EACH ROW EXECUTE FUNCTION upload_blob_refs()
+      `);
+    }
+
     // Session table (for connect-pg-simple)
     await pool.query(`
       CREATE TABLE IF NOT EXISTS session (
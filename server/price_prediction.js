@@ -5,6 +5,7 @@
 
 const { spawn } = require('child_process');
 const path = require('path');
+const { aiScheduler } = require('./ai_scheduler');
 
 /**
  * Call Gemini AI model to predict price
@@ -13,9 +14,21 @@ const path = require('path');
  * @param {string} title - Product title (optional)
  * @param {string} description - Product description (optional)
  * @param {number} userPrice - User's entered price (optional)
+ * @param {Object} options - Scheduling: { priority: 'interactive'|'batch', userId }
  * @returns {Promise} Price prediction result
  */
-function predictPrice(category, condition, title = '', description = '', userPrice = 0) {
+function predictPrice(category, condition, title = '', description = '', userPrice = 0, options = {}) {
+  return aiScheduler.schedule(
+    (signal) => runPricePrediction(category, condition, title, description, userPrice, signal),
+    options
+  );
+}
+
+/**
+ * Spawn the Python predictor (called by the scheduler when a slot is free)
+ * @param {AbortSignal} signal - Aborted by the scheduler on timeout; kills the process
+ */
+function runPricePrediction(category, condition, title, description, userPrice, signal) {
   return new Promise((resolve, reject) => {
     const pythonScript = path.join(__dirname, '../ai_gemini_predictor.py');
     
@@ -39,7 +52,7 @@ function predictPrice(category, condition, title = '', description = '', userPri
     console.log('🤖 Calling AI predictor:', args.join(' '));
     
     // Spawn Python process
-    const pythonProcess = spawn(pythonExe, args);
+    const pythonProcess = spawn(pythonExe, args, { signal });
     
     let dataString = '';
     let errorString = '';
@@ -17,6 +17,7 @@ const multer = require("multer");
 const crypto = require("crypto");
 
 // Multer setup for product images
+// Files land here under a random name first, then move into the content-addressed store
 const upload = multer({
   dest: path.join(__dirname, "../uploads/"),
   limits: { fileSize: 5 * 1024 * 1024, files: 3 },
@@ -102,6 +103,10 @@ app.get("/api/debug/files", (req, res) => {
 // Automatically uses PostgreSQL in production, SQLite locally
 const db = require('./database');
 
+// ====== UPLOAD STORE ======
+// Content-addressed (deduplicated) storage for product images
+const uploadStore = require('./upload_store');
+
 // Initialize database and start server
 async function startServer() {
   // Initialize PostgreSQL tables if using Postgres
@@ -123,6 +128,21 @@ async function startServer() {
       console.log(` Public URL: ${process.env.BASE_URL}`);
     }
   });
+
+  // Periodically archive cold data (sold products, old messages/sales, unused uploads)
+  const archiveIntervalHours = parseFloat(process.env.ARCHIVE_INTERVAL_HOURS || '0');
+  if (archiveIntervalHours > 0) {
+    const { archiveColdData } = require('./archive');
+    setInterval(() => {
+      archiveColdData()
+        .then(() => syncSimilarItemsIndex())
+        .catch(err => console.error('❌ Archival job failed:', err));
+    }, archiveIntervalHours * 60 * 60 * 1000);
+    console.log(`📦 Archival job scheduled every ${archiveIntervalHours}h`);
+  }
+
+  // Bring the similar-items index in line with the database (unchanged items are skipped)
+  syncSimilarItemsIndex();
 }
 
 
@@ -295,6 +315,157 @@ const { predictPrice } = require('./price_prediction');
 // ====== AI IMAGE ANALYSIS ======
 const { analyzeImage } = require('./image_analysis');
 
+// ====== AI JOB SCHEDULER ======
+const { aiScheduler } = require('./ai_scheduler');
+
+// Fairness key for AI jobs: the logged-in user, or the client IP for anonymous calls
+function aiJobOwner(req) {
+  return req.session && req.session.user ? `user:${req.session.user.user_id}` : `ip:${req.ip}`;
+}
+
+// ====== SIMILAR ITEMS (local vector index) ======
+const similarItems = require('./similar_items');
+
+// Re-index every product and sold item, dropping anything no longer in the database
+function syncSimilarItemsIndex() {
+  // Snapshot the index keys before reading the database: anything indexed
+  // after this point (a new listing) is never treated as stale
+  similarItems.listIndexedKeys()
+    .then(indexedKeys => {
+      db.all('SELECT product_id, title, category, description FROM products', [], (err, products) => {
+        if (err) return console.warn('⚠️ Similar items sync skipped:', err.message);
+        db.all('SELECT sold_id, title, category, description FROM sold_items', [], (err2, soldItems) => {
+          if (err2) return console.warn('⚠️ Similar items sync skipped:', err2.message);
+          const items = [
+            ...products.map(row => similarItems.toIndexItem(row, 'product')),
+            ...soldItems.map(row => similarItems.toIndexItem(row, 'sold'))
+          ];
+          const currentKeys = new Set(items.map(item => item.key));
+          const staleKeys = indexedKeys.filter(key => !currentKeys.has(key));
+          (staleKeys.length ? similarItems.removeItems(staleKeys) : Promise.resolve())
+            .then(() => similarItems.indexItems(items))
+            .then(result => console.log(`🧭 Similar items index synced (${result.indexed || 0} updated, ${staleKeys.length} removed, ${result.total || 0} total)`))
+            .catch(e => console.warn('⚠️ Similar items sync failed:', e.message));
+        });
+      });
+    })
+    .catch(e => console.warn('⚠️ Similar items sync failed:', e.message));
+}
+
+// Keep the index up to date without delaying the response
+function indexListing(row, type = 'product') {
+  similarItems.indexItems([similarItems.toIndexItem(row, type)])
+    .catch(e => console.warn('⚠️ Failed to index listing:', e.message));
+}
+
+function unindexListing(productId, soldIds = []) {
+  similarItems.removeItems([`product:${productId}`, ...soldIds.map(soldId => `sold:${soldId}`)])
+    .catch(e => console.warn('⚠️ Failed to remove listing from index:', e.message));
+}
+
+// Turn index matches into listings (available products and past sales)
+function loadSimilarListings(matches, callback) {
+  const productIds = [];
+  const soldIds = [];
+  matches.forEach(match => {
+    const { type, id } = similarItems.parseKey(match.key);
+    if (type === 'product') productIds.push(id);
+    else if (type === 'sold') soldIds.push(id);
+  });
+
+  const placeholders = (ids) => ids.map(() => '?').join(', ');
+  const productSql = productIds.length
+    ? `SELECT p.*, u.full_name as seller_name FROM products p
+       LEFT JOIN users u ON p.seller_id = u.user_id
+       WHERE p.product_id IN (${placeholders(productIds)})`
+    : null;
+  const soldSql = soldIds.length
+    ? `SELECT * FROM sold_items WHERE sold_id IN (${placeholders(soldIds)})`
+    : null;
+
+  const fetchRows = (sql, params, done) => (sql ? db.all(sql, params, done) : done(null, []));
+
+  fetchRows(productSql, productIds, (err, products) => {
+    if (err) return callback(err);
+    fetchRows(soldSql, soldIds, (err2, soldRows) => {
+      if (err2) return callback(err2);
+      const byKey = {};
+      products.forEach(row => { byKey[`product:${row.product_id}`] = row; });
+      soldRows.forEach(row => { byKey[`sold:${row.sold_id}`] = row; });
+
+      // Keep index order (best score first); skip rows deleted since indexing
+      const listings = matches
+        .filter(match => byKey[match.key])
+        .map(match => ({
+          type: similarItems.parseKey(match.key).type,
+          score: match.score,
+          near_duplicate: match.near_duplicate,
+          item: byKey[match.key]
+        }));
+      callback(null, listings);
+    });
+  });
+}
+
+/**
+ * GET /api/products/:id/similar?k=6
+ * Related listings for a product, from the local similar-items index
+ */
+app.get("/api/products/:id/similar", (req, res) => {
+  const id = req.params.id;
+  const k = Math.min(parseInt(req.query.k) || 6, 50);
+
+  db.get('SELECT product_id, title, category, description FROM products WHERE product_id = ?', [id], async (err, row) => {
+    if (err) return res.status(500).json({ error: err.message });
+    if (!row) return res.status(404).json({ error: 'Product not found' });
+
+    try {
+      // Ask for a few extra so sale snapshots of this same product can be dropped
+      const [matches] = await similarItems.findSimilar([similarItems.toIndexItem(row, 'product')], k + 5);
+      loadSimilarListings(matches, (loadErr, listings) => {
+        if (loadErr) return res.status(500).json({ error: loadErr.message });
+        const similar = listings
+          .filter(listing => !(listing.type === 'sold' && String(listing.item.product_id) === String(id)))
+          .slice(0, k);
+        res.json({ product_id: row.product_id, similar });
+      });
+    } catch (error) {
+      console.error('❌ Similar items error:', error);
+      res.status(500).json({ error: 'Failed to find similar items', message: error.message });
+    }
+  });
+});
+
+/**
+ * POST /api/similar-items
+ * Find listings similar to a draft (title/description/category), e.g. to warn
+ * about near-duplicate listings from the create-listing form
+ */
+app.post("/api/similar-items", async (req, res) => {
+  const { title, description, category, k } = req.body || {};
+
+  if (!title && !description) {
+    return res.status(400).json({ error: 'Title or description is required' });
+  }
+
+  try {
+    const [matches] = await similarItems.findSimilar(
+      [{ title: title || '', description: description || '', category: category || '' }],
+      Math.min(parseInt(k) || 10, 50)
+    );
+    loadSimilarListings(matches, (loadErr, similar) => {
+      if (loadErr) return res.status(500).json({ error: loadErr.message });
+      res.json({
+        similar,
+        near_duplicate: similar.some(listing => listing.type === 'product' && listing.near_duplicate)
+      });
+    });
+  } catch (error) {
+    console.error('❌ Similar items error:', error);
+    res.status(500).json({ error: 'Failed to find similar items', message: error.message });
+  }
+});
+
 /**
  * POST /api/predict-price
  * Predict fair price for a product using Gemini AI
@@ -316,7 +487,8 @@ app.post("/api/predict-price", async (req, res) => {
       condition, 
       title || '', 
       description || '', 
-      userPrice || 0
+      userPrice || 0,
+      { priority: 'interactive', userId: aiJobOwner(req) }
     );
     
     res.json({
@@ -364,13 +536,13 @@ app.get("/api/price-categories", (req, res) => {
  * POST /api/upload-temp-image
  * Upload a temporary image for AI analysis (before product creation)
  */
-app.post("/api/upload-temp-image", upload.single('image1'), (req, res) => {
+app.post("/api/upload-temp-image", upload.single('image1'), async (req, res) => {
   try {
     if (!req.file) {
       return res.status(400).json({ error: 'No image file uploaded' });
     }
     
-    const imagePath = path.join(__dirname, '..', 'uploads', req.file.filename);
+    const { absolutePath: imagePath } = await uploadStore.storeUpload(req.file);
     console.log(`📸 Temp image uploaded: ${imagePath}`);
     
     res.json({ 
@@ -405,7 +577,7 @@ app.post("/api/analyze-image", async (req, res) => {
     console.log(`🔍 Analyzing ${paths.length} image(s)`);
     
     // Call AI image analyzer with all images
-    const analysis = await analyzeImage(paths);
+    const analysis = await analyzeImage(paths, { priority: 'interactive', userId: aiJobOwner(req) });
     
     // Add shadow ban flag if not legitimate
     if (!analysis.is_legitimate || analysis.legitimacy_score < 70) {
@@ -1114,6 +1286,7 @@ app.delete("/api/admin/users/:userId", requireAdmin, (req, res) => {
                           console.error('Error deleting user:', err3);
                           return res.status(500).json({ message: "Error deleting user" });
                         }
+                        syncSimilarItemsIndex();
                         res.json({ message: "User deleted successfully" });
                       });
                     });
@@ -1185,6 +1358,8 @@ app.delete("/api/admin/products/:productId", requireAdmin, (req, res) => {
               console.error('Error deleting product:', err);
               return res.status(500).json({ message: "Error deleting product" });
             }
+            // sold_items for this product were deleted too, so resync rather than remove one key
+            syncSimilarItemsIndex();
             res.json({ message: "Product deleted successfully" });
           });
         });
@@ -1193,6 +1368,11 @@ app.delete("/api/admin/products/:productId", requireAdmin, (req, res) => {
   });
 });
 
+// AI scheduler queue depth and wait-time metrics
+app.get("/api/admin/ai-scheduler", requireAdmin, (req, res) => {
+  res.json(aiScheduler.stats());
+});
+
 // Get all messages
 app.get("/api/admin/messages", requireAdmin, (req, res) => {
   db.all(`
@@ -1383,7 +1563,7 @@ app.post("/api/resend-verification", async (req, res) => {
  * POST /api/upload-temp-images
  * Upload images temporarily for AI analysis (before product creation)
  */
-app.post("/api/upload-temp-images", requireAuth, upload.any(), (req, res) => {
+app.post("/api/upload-temp-images", requireAuth, upload.any(), async (req, res) => {
   try {
     const filesArray = req.files || [];
     
@@ -1391,10 +1571,9 @@ app.post("/api/upload-temp-images", requireAuth, upload.any(), (req, res) => {
       return res.status(400).json({ error: 'No images uploaded' });
     }
 
-    // Get absolute paths for all uploaded images
-    const imagePaths = filesArray.map(f => {
-      return path.join(__dirname, '..', 'uploads', path.basename(f.path));
-    });
+    // Get absolute paths for all uploaded images (stored by content digest)
+    const stored = await Promise.all(filesArray.map(f => uploadStore.storeUpload(f)));
+    const imagePaths = stored.map(blob => blob.absolutePath);
 
     console.log(`📤 Uploaded ${imagePaths.length} temp image(s) for AI analysis`);
     
@@ -1413,7 +1592,7 @@ app.post("/api/upload-temp-images", requireAuth, upload.any(), (req, res) => {
 
 // PRODUCTS ROUTES
 // Add a new product (requires authentication and verified email)
-app.post("/api/products", requireVerifiedEmail, upload.any(), (req, res) => {
+app.post("/api/products", requireVerifiedEmail, upload.any(), async (req, res) => {
   const user = req.session.user;
   if (!user) {
     return res.status(403).json({ error: "Please log in to add a product" });
@@ -1424,14 +1603,19 @@ app.post("/api/products", requireVerifiedEmail, upload.any(), (req, res) => {
     console.warn('Add product failed: missing title', { body: req.body, files: req.files });
     return res.status(400).json({ error: 'Product title is required' });
   }
-  // Save file paths (relative to /uploads) - with upload.any(), files come as array
-  const filesArray = req.files || [];
+  // Save file paths (relative to /uploads) - with upload.any(), files come as array.
+  // Images already uploaded for AI analysis resolve to the same stored file.
+  const filesArray = (req.files || []).filter(f => ['image1', 'image2', 'image3'].includes(f.fieldname));
   const imageMap = {};
-  filesArray.forEach(f => {
-    if (f.fieldname === 'image1' || f.fieldname === 'image2' || f.fieldname === 'image3') {
-      imageMap[f.fieldname] = `/uploads/${path.basename(f.path)}`;
-    }
-  });
+  try {
+    const stored = await Promise.all(filesArray.map(f => uploadStore.storeUpload(f)));
+    filesArray.forEach((f, i) => {
+      imageMap[f.fieldname] = stored[i].url;
+    });
+  } catch (storeErr) {
+    console.error("Add product failed: could not store images:", storeErr.message);
+    return res.status(500).json({ error: 'Failed to save images' });
+  }
   const images = [imageMap.image1 || null, imageMap.image2 || null, imageMap.image3 || null];
   const stock = parseInt(quantity) || 1;
   db.run(
@@ -1444,6 +1628,7 @@ app.post("/api/products", requireVerifiedEmail, upload.any(), (req, res) => {
         console.error("Add product failed:", err.message);
         return res.status(500).json({ error: err.message });
       }
+      indexListing({ product_id: this.lastID, title, category, description });
       res.json({ product_id: this.lastID, message: "Product added successfully" });
     }
   );
@@ -1517,37 +1702,46 @@ app.delete("/api/products/:id", requireVerifiedEmail, (req, res) => {
     // 4. Delete messages for this product
     // 5. Finally, delete the product
     
-    // 1. Delete reviews for this product
-    db.run("DELETE FROM reviews WHERE product_id = ?", [id], function (reviewsErr) {
-      if (reviewsErr) {
-        console.warn(`⚠️ Failed to delete reviews for product ${id}:`, reviewsErr.message);
+    // Sold snapshots are indexed separately; note their ids before they are deleted
+    db.all("SELECT sold_id FROM sold_items WHERE product_id = ?", [id], (soldIdsErr, soldRows) => {
+      if (soldIdsErr) {
+        console.warn(`⚠️ Failed to look up sold_items for product ${id}:`, soldIdsErr.message);
       }
-      
-      // 2. Delete sold_items for this product
-      db.run("DELETE FROM sold_items WHERE product_id = ?", [id], function (soldErr) {
-        if (soldErr) {
-          console.warn(`⚠️ Failed to delete sold_items for product ${id}:`, soldErr.message);
+      const soldIds = (soldRows || []).map(r => r.sold_id);
+
+      // 1. Delete reviews for this product
+      db.run("DELETE FROM reviews WHERE product_id = ?", [id], function (reviewsErr) {
+        if (reviewsErr) {
+          console.warn(`⚠️ Failed to delete reviews for product ${id}:`, reviewsErr.message);
         }
-        
-        // 3. Delete wishlist entries for this product
-        db.run("DELETE FROM wishlist WHERE product_id = ?", [id], function (wishlistErr) {
-          if (wishlistErr) {
-            console.warn(`⚠️ Failed to delete wishlist entries for product ${id}:`, wishlistErr.message);
+      
+        // 2. Delete sold_items for this product
+        db.run("DELETE FROM sold_items WHERE product_id = ?", [id], function (soldErr) {
+          if (soldErr) {
+            console.warn(`⚠️ Failed to delete sold_items for product ${id}:`, soldErr.message);
           }
-          
-          // 4. Delete messages related to this product (item_id is the column name, not product_id)
-          db.run("DELETE FROM messages WHERE item_id = ?", [id], function (messagesErr) {
-            if (messagesErr) {
-              console.warn(`⚠️ Failed to delete messages for product ${id}:`, messagesErr.message);
+        
+          // 3. Delete wishlist entries for this product
+          db.run("DELETE FROM wishlist WHERE product_id = ?", [id], function (wishlistErr) {
+            if (wishlistErr) {
+              console.warn(`⚠️ Failed to delete wishlist entries for product ${id}:`, wishlistErr.message);
             }
-            
-            // 5. Now delete the product itself
-            db.run("DELETE FROM products WHERE product_id = ?", [id], function (err) {
-              if (err) {
-                console.error(`❌ DB.run error: ${err.message}\n   Query: DELETE FROM products WHERE product_id = ?`);
-                return res.status(500).json({ error: err.message });
+          
+            // 4. Delete messages related to this product (item_id is the column name, not product_id)
+            db.run("DELETE FROM messages WHERE item_id = ?", [id], function (messagesErr) {
+              if (messagesErr) {
+                console.warn(`⚠️ Failed to delete messages for product ${id}:`, messagesErr.message);
               }
-              res.json({ message: "Product deleted", undoAvailable: deletedStack.length > 0 });
+            
+              // 5. Now delete the product itself
+              db.run("DELETE FROM products WHERE product_id = ?", [id], function (err) {
+                if (err) {
+                  console.error(`❌ DB.run error: ${err.message}\n   Query: DELETE FROM products WHERE product_id = ?`);
+                  return res.status(500).json({ error: err.message });
+                }
+                unindexListing(id, soldIds);
+                res.json({ message: "Product deleted", undoAvailable: deletedStack.length > 0 });
+              });
             });
           });
         });
@@ -1579,6 +1773,7 @@ app.put("/api/products/:id", requireVerifiedEmail, (req, res) => {
       [title, category, price, condition, description, contact_info, status || oldRow.status, image1 || oldRow.image1, image2 || oldRow.image2, image3 || oldRow.image3, id],
       function (err) {
         if (err) return res.status(500).json({ error: err.message });
+        indexListing({ product_id: id, title, category, description });
         res.json({
           message: "Product updated successfully",
           undoAvailable: editHistoryStack.length > 0,
@@ -1631,6 +1826,7 @@ app.post('/api/products/:id/book', requireVerifiedEmail, (req, res) => {
             console.error('Failed to insert into sold_items:', sErr.message);
             return res.status(500).json({ error: 'Failed to record sale' });
           }
+          indexListing({ sold_id: this.lastID, title: row.title, category: row.category, description: row.description }, 'sold');
 
           // Build a friendly message to notify the seller with buyer contact info
           const buyerName = user.full_name || 'Buyer';
@@ -0,0 +1,131 @@
+/**
+ * Similar Items Module - Node.js wrapper for the local vector index
+ * Powers "related listings" and near-duplicate listing detection
+ */
+
+const { spawn } = require('child_process');
+const path = require('path');
+const fs = require('fs');
+
+/**
+ * Run ai_similar_items.py with a JSON payload on stdin
+ * @param {string[]} args - Command and its options (e.g. ['search', '10'])
+ * @param {Array} payload - Items, keys or queries
+ * @returns {Promise<Object>} Parsed JSON result
+ */
+function runSimilarItems(args, payload) {
+    return new Promise((resolve, reject) => {
+        // Determine Python executable path
+        let pythonCmd = 'python';
+        const venvPythonWin = path.join(__dirname, '..', 'venv', 'Scripts', 'python.exe');
+        const venvPythonUnix = path.join(__dirname, '..', 'venv', 'bin', 'python');
+        if (fs.existsSync(venvPythonWin)) {
+            pythonCmd = venvPythonWin;
+        } else if (fs.existsSync(venvPythonUnix)) {
+            pythonCmd = venvPythonUnix;
+        }
+
+        const scriptPath = path.join(__dirname, '..', 'ai_similar_items.py');
+        const pythonProcess = spawn(pythonCmd, [scriptPath, ...args]);
+
+        let output = '';
+        let errorOutput = '';
+
+        pythonProcess.stdout.on('data', (data) => {
+            output += data.toString();
+        });
+
+        pythonProcess.stderr.on('data', (data) => {
+            errorOutput += data.toString();
+        });
+
+        pythonProcess.on('close', (code) => {
+            if (code !== 0) {
+                reject(new Error(`Similar items ${args[0]} failed: ${errorOutput || output}`));
+                return;
+            }
+
+            try {
+                const lines = output.trim().split('\n');
+                resolve(JSON.parse(lines[lines.length - 1]));
+            } catch (error) {
+                reject(new Error(`Failed to parse similar items result: ${error.message}`));
+            }
+        });
+
+        pythonProcess.on('error', (err) => {
+            reject(new Error('Failed to start Python process: ' + err.message));
+        });
+
+        pythonProcess.stdin.end(JSON.stringify(payload));
+    });
+}
+
+/**
+ * Build an index item from a products or sold_items row
+ * @param {Object} row - Database row
+ * @param {string} type - 'product' or 'sold'
+ */
+function toIndexItem(row, type = 'product') {
+    const id = type === 'sold' ? row.sold_id : row.product_id;
+    return {
+        key: `${type}:${id}`,
+        title: row.title || '',
+        category: row.category || '',
+        description: row.description || ''
+    };
+}
+
+/**
+ * Split an index key back into its type and id
+ * @param {string} key - e.g. 'product:12' or 'sold:3'
+ */
+function parseKey(key) {
+    const [type, id] = String(key).split(':');
+    return { type, id: parseInt(id, 10) };
+}
+
+/**
+ * Add or refresh items in the index (unchanged items are skipped)
+ * @param {Object[]} items - Output of toIndexItem()
+ */
+function indexItems(items) {
+    return runSimilarItems(['index'], items);
+}
+
+/**
+ * Keys currently in the index
+ * @returns {Promise<string[]>}
+ */
+async function listIndexedKeys() {
+    const result = await runSimilarItems(['keys'], []);
+    return result.keys || [];
+}
+
+/**
+ * Remove items from the index
+ * @param {string[]} keys - e.g. ['product:12']
+ */
+function removeItems(keys) {
+    return runSimilarItems(['remove'], keys);
+}
+
+/**
+ * Top-k cosine search for one or more queries in a single batch
+ * @param {Object[]} queries - { key?, title, category, description }
+ * @param {number} k - Results per query
+ * @returns {Promise<Array[]>} For each query: [{ key, score, near_duplicate }]
+ */
+async function findSimilar(queries, k = 10) {
+    const result = await runSimilarItems(['search', String(k)], queries);
+    return result.results || queries.map(() => []);
+}
+
+module.exports = {
+    toIndexItem,
+    parseKey,
+    indexItems,
+    listIndexedKeys,
+    removeItems,
+    findSimilar
+};
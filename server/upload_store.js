@@ -0,0 +1,236 @@
+/**
+ * Content-Addressed Upload Store for CampX Marketplace
+ * Product images are stored once per unique content, keyed by SHA-256 digest:
+ *
+ *   uploads/ab/cd/abcd1234...   →   served as /uploads/ab/cd/abcd1234...
+ *
+ * The same photo uploaded for AI analysis and again with the listing (or
+ * snapshotted into sold_items) therefore takes up space only once.
+ * upload_blobs keeps one row per stored file with its reference count
+ * across the products/sold_items image columns (and their archive tables),
+ * maintained by database triggers (scripts/create_db.py, init-postgres.js).
+ */
+
+const path = require('path');
+const fs = require('fs');
+const crypto = require('crypto');
+const db = require('./database');
+
+const UPLOADS_DIR = path.join(__dirname, '../uploads');
+
+// Tables whose image1..image3 columns point into uploads/
+const IMAGE_TABLES = ['products', 'sold_items', 'products_archive', 'sold_items_archive'];
+const IMAGE_COLUMNS = ['image1', 'image2', 'image3'];
+
+const DIGEST_PATTERN = /^[0-9a-f]{64}$/;
+
+// Promise helpers over the callback-style db handle (SQLite and PostgreSQL wrapper)
+function dbAll(query, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(query, params, (err, rows) => (err ? reject(err) : resolve(rows || [])));
+  });
+}
+
+function dbRun(query, params = []) {
+  return new Promise((resolve, reject) => {
+    db.run(query, params, function (err) {
+      if (err) return reject(err);
+      resolve({ changes: this ? this.changes : 0 });
+    });
+  });
+}
+
+/**
+ * SHA-256 of a file, streamed so large uploads aren't read into memory
+ * @param {string} filePath - Absolute path
+ * @returns {Promise<string>} Hex digest
+ */
+function hashFile(filePath) {
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    fs.createReadStream(filePath)
+      .on('error', reject)
+      .on('data', chunk => hash.update(chunk))
+      .on('end', () => resolve(hash.digest('hex')));
+  });
+}
+
+/**
+ * Sharded location of a digest: two levels of two hex chars each
+ */
+function blobRelativePath(digest) {
+  return path.posix.join(digest.slice(0, 2), digest.slice(2, 4), digest);
+}
+
+function blobPath(digest) {
+  return path.join(UPLOADS_DIR, blobRelativePath(digest));
+}
+
+function blobUrl(digest) {
+  return `/uploads/${blobRelativePath(digest)}`;
+}
+
+/**
+ * Move a file into the store. If identical content is already stored the new
+ * copy is discarded instead.
+ * @param {string} filePath - File to ingest (e.g. a multer temp file); it is moved or removed
+ * @param {Object} options - { keepOriginal: true } leaves filePath in place as a hardlink to the blob
+ * @returns {Promise<{digest, url, absolutePath, size, deduplicated}>}
+ */
+async function storeFile(filePath, { keepOriginal = false } = {}) {
+  const digest = await hashFile(filePath);
+  const target = blobPath(digest);
+  const { size } = await fs.promises.stat(filePath);
+  await fs.promises.mkdir(path.dirname(target), { recursive: true });
+
+  // Refresh mtime first so the upload sweep's grace period restarts for an
+  // existing blob before the incoming copy is discarded. If the sweep removed
+  // it in the meantime, the incoming file simply becomes the blob.
+  let deduplicated = false;
+  try {
+    const now = new Date();
+    await fs.promises.utimes(target, now, now);
+    deduplicated = true;
+  } catch (err) {
+    if (err.code !== 'ENOENT') throw err;
+  }
+
+  if (deduplicated) {
+    await fs.promises.unlink(filePath);
+    if (keepOriginal) await fs.promises.link(target, filePath);
+  } else if (keepOriginal) {
+    await fs.promises.link(filePath, target);
+  } else {
+    await fs.promises.rename(filePath, target);
+  }
+
+  try {
+    await dbRun(
+      `INSERT INTO upload_blobs (digest, size, ref_count) VALUES (?, ?, 0)
+       ON CONFLICT (digest) DO NOTHING`,
+      [digest, size]
+    );
+  } catch (err) {
+    // The file is stored either way; counts are rebuilt by recountReferences()
+    console.warn('⚠️ Failed to record upload blob:', err.message);
+  }
+
+  return { digest, url: blobUrl(digest), absolutePath: target, size, deduplicated };
+}
+
+/**
+ * Store a multer file object
+ * @param {Object} file - req.file / an entry of req.files
+ */
+function storeUpload(file) {
+  return storeFile(file.path);
+}
+
+/**
+ * Count references to each upload file (by file name) across the image columns.
+ * Tables missing on older databases are skipped.
+ * @returns {Promise<Map<string, number>>}
+ */
+async function collectReferences() {
+  const counts = new Map();
+  const queries = [
+    ...IMAGE_TABLES.map(table => `SELECT ${IMAGE_COLUMNS.join(', ')} FROM ${table}`),
+    'SELECT avatar FROM users'
+  ];
+  for (const query of queries) {
+    let rows;
+    try {
+      rows = await dbAll(query);
+    } catch (err) {
+      console.warn('⚠️ Skipping reference scan:', err.message);
+      continue;
+    }
+    rows.forEach(row => {
+      Object.values(row).forEach(value => {
+        if (!value) return;
+        const name = path.basename(String(value));
+        counts.set(name, (counts.get(name) || 0) + 1);
+      });
+    });
+  }
+  return counts;
+}
+
+/**
+ * Reference counts of every stored blob, as maintained by the triggers
+ * @returns {Promise<Map<string, number>>} digest -> ref_count
+ */
+async function loadRefCounts() {
+  const rows = await dbAll('SELECT digest, ref_count FROM upload_blobs');
+  return new Map(rows.map(row => [row.digest, Number(row.ref_count) || 0]));
+}
+
+/**
+ * Rebuild upload_blobs.ref_count from the image columns (repair tool, e.g.
+ * after a migration or for blobs stored before the triggers existed)
+ * @param {Map<string, number>} references - Optional result of collectReferences()
+ * @returns {Promise<{blobs: number, unreferenced: number, bytes: number}>}
+ */
+async function recountReferences(references) {
+  const counts = references || await collectReferences();
+  const blobs = await dbAll('SELECT digest, size, ref_count FROM upload_blobs');
+  let unreferenced = 0;
+  let bytes = 0;
+
+  for (const blob of blobs) {
+    const refCount = counts.get(blob.digest) || 0;
+    if (refCount === 0) unreferenced++;
+    bytes += Number(blob.size) || 0;
+    if (refCount !== Number(blob.ref_count)) {
+      await dbRun('UPDATE upload_blobs SET ref_count = ? WHERE digest = ?', [refCount, blob.digest]);
+    }
+  }
+
+  return { blobs: blobs.length, unreferenced, bytes };
+}
+
+/**
+ * Drop upload_blobs rows for files that were deleted from disk
+ * @param {string[]} digests
+ */
+async function forgetBlobs(digests) {
+  const valid = digests.filter(d => DIGEST_PATTERN.test(d));
+  for (let i = 0; i < valid.length; i += 500) {
+    const batch = valid.slice(i, i + 500);
+    await dbRun(`DELETE FROM upload_blobs WHERE digest IN (${batch.map(() => '?').join(', ')})`, batch);
+  }
+}
+
+/**
+ * Every file under uploads/ (legacy flat files and sharded blobs), skipping dotfiles
+ * @returns {Array<{name, filePath, isBlob}>}
+ */
+function listUploadFiles(dir = UPLOADS_DIR) {
+  const files = [];
+  for (const entry of fs.readdirSync(dir, { withFileTypes: true })) {
+    if (entry.name.startsWith('.')) continue;
+    const filePath = path.join(dir, entry.name);
+    if (entry.isDirectory()) {
+      files.push(...listUploadFiles(filePath));
+    } else if (entry.isFile()) {
+      files.push({ name: entry.name, filePath, isBlob: dir !== UPLOADS_DIR && DIGEST_PATTERN.test(entry.name) });
+    }
+  }
+  return files;
+}
+
+module.exports = {
+  UPLOADS_DIR,
+  IMAGE_TABLES,
+  IMAGE_COLUMNS,
+  hashFile,
+  blobPath,
+  blobUrl,
+  storeFile,
+  storeUpload,
+  collectReferences,
+  loadRefCounts,
+  recountReferences,
+  forgetBlobs,
+  listUploadFiles
+};